@@ -26,6 +26,10 @@ USAGE:
 ------
 Simply run the script and follow the prompts:
 python3 cloudshell_dsql_elasticache.py
+
+Cache-hit iterations run one at a time by default. Optional flags:
+  --concurrent   After the timed iterations, also measure concurrent lookup throughput
+  --batch-hits   Pipeline all cache-hit lookups into one Valkey round-trip
 """
 
 import os
@@ -33,10 +37,15 @@ import sys
 import time
 import logging
 import datetime
+import functools
+import hashlib
+import pickle
 import threading
 import warnings
-from typing import Optional, Tuple, Any, List
-from queue import Queue, Empty
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Optional, Tuple, List, Dict
+from queue import SimpleQueue, Empty
 
 # Suppress Python deprecation warnings from boto3
 warnings.filterwarnings('ignore', category=Warning)
@@ -45,8 +54,12 @@ warnings.filterwarnings('ignore', category=Warning)
 
 import boto3
 import psycopg2
-from psycopg2 import pool
+import psycopg2.errors
+import psycopg2.extensions
+import psycopg2.extras
+import lz4.frame
 import redis
+from redis.utils import HIREDIS_AVAILABLE
 from botocore.exceptions import ClientError
 
 # Configure logging
@@ -61,7 +74,7 @@ logger = logging.getLogger(__name__)
 CONFIG = {
     'valkey': {
         'url': os.environ.get('VALKEY_URL', 'valkey://localhost:6379'),  # Will be updated with actual endpoint
-        'ttl': int(os.environ.get('VALKEY_TTL', '30')),  # Cache TTL in seconds (30 seconds for 9 iterations)
+        'ttl': int(os.environ.get('VALKEY_TTL', '3600')),  # Cache TTL in seconds; freshness comes from table versions
     },
     'dsql': {
         'region': os.environ.get('AWS_REGION', 'us-east-1'),
@@ -74,22 +87,95 @@ CONFIG = {
         'min_connections': int(os.environ.get('DSQL_POOL_MIN', '5')),  # Minimum connections in pool
         'max_connections': int(os.environ.get('DSQL_POOL_MAX', '30')), # Maximum connections in pool
         'connection_timeout': int(os.environ.get('DSQL_POOL_TIMEOUT', '30')), # Connection timeout in seconds
+        'prune_interval': int(os.environ.get('DSQL_POOL_PRUNE_INTERVAL', '60')), # Seconds between idle connection probes; 0 or less disables probing
     },
     'queries': {
         'simple': 'SELECT * FROM users1;',
         'complex': 'SELECT u.user_id, u.name, u.email, u.department, u.role, u.last_login, COUNT(DISTINCT o.order_date) as active_days, COUNT(o.order_id) as recent_orders, COALESCE(SUM(o.order_amount), 0) as recent_spending, COALESCE(AVG(o.order_amount), 0) as avg_order_size, STRING_AGG(DISTINCT o.order_type, \', \') as order_types FROM users u LEFT JOIN orders o ON u.user_id = o.user_id AND o.order_date >= CURRENT_DATE - INTERVAL \'30 days\' WHERE u.user_id = 1 GROUP BY u.user_id, u.name, u.email, u.department, u.role, u.last_login;'
+    },
+    # Tables each query reads; writing to one of these bumps its version and
+    # moves the query to a new cache key
+    'query_tables': {
+        'simple': ['users1'],
+        'complex': ['users', 'orders'],
     }
 }
 
 
+# Hot-path settings hoisted out of CONFIG so each use is a single global lookup.
+# Code that changes CONFIG after import must update these too (see __main__).
+_REGION = CONFIG['dsql']['region']
+_TTL = CONFIG['valkey']['ttl']
+_POOL_MIN = CONFIG['connection_pool']['min_connections']
+_POOL_MAX = CONFIG['connection_pool']['max_connections']
+_POOL_TIMEOUT = CONFIG['connection_pool']['connection_timeout']
+_POOL_PRUNE_INTERVAL = CONFIG['connection_pool']['prune_interval']
+
+
+# Cached values are Valkey hashes: the pickled query rows live in one field and
+# the original DSQL time (nanoseconds) in another, so a hit needs no parsing
+CACHE_RESULT_FIELD = 'r'
+CACHE_DSQL_TIME_FIELD = 't'
+
+# The result field starts with a one-byte format flag. Results of at least
+# CACHE_COMPRESS_MIN_BYTES are LZ4-compressed; smaller ones gain nothing from it.
+CACHE_FORMAT_RAW = b'\x00'
+CACHE_FORMAT_LZ4 = b'\x01'
+CACHE_COMPRESS_MIN_BYTES = 128
+
+# Timings are measured with time.perf_counter_ns() and only converted for display
+NS_PER_MS = 1_000_000
+NS_PER_SECOND = 1_000_000_000
+
+
+# DSQL auth tokens are valid for ~15 minutes; reuse each one for 10 and
+# refresh a minute early so a connection never opens with a stale token
+TOKEN_CACHE_SECONDS = 600
+TOKEN_REFRESH_MARGIN_SECONDS = 60
+
+
 # Global connection pool instance
 dsql_connection_pool = None
 
+# Global Valkey client and the endpoint it was created for
+valkey_client = None
+valkey_client_endpoint = None
+
+# Cache keys currently being refreshed from DSQL, guarded by _inflight_lock
+_inflight: Dict[str, threading.Event] = {}
+_inflight_lock = threading.Lock()
+
+
+class DSQLConnection(psycopg2.extensions.connection):
+    """
+    psycopg2 connection that remembers which statements it has prepared and
+    keeps one cursor for reuse.
+    
+    Pooled connections are used by one thread at a time, so the cursor is
+    only ever used sequentially. Query paths use the default tuple cursor.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements = set()
+        self._cached_cursor = None
+    
+    def cached_cursor(self):
+        """Return this connection's reusable cursor, creating it on first use."""
+        if self._cached_cursor is None or self._cached_cursor.closed:
+            self._cached_cursor = self.cursor()
+        return self._cached_cursor
+
 
 class DSQLConnectionPool:
     """
-    Connection pool for DSQL using psycopg2's ThreadedConnectionPool.
-    Generates a fresh token for each connection request.
+    Connection pool for DSQL built on a queue of idle connections.
+    
+    Acquiring an idle connection takes no pool-wide lock; the lock is only
+    taken to open a new connection, to hand a returned connection to a
+    waiting thread (first come, first served), or to refresh the auth token.
+    Reuses one DSQL client and shares each auth token across connections
+    until shortly before it expires.
     """
     
     def __init__(self, cluster_endpoint: str, region: str):
@@ -105,37 +191,66 @@ class DSQLConnectionPool:
         self.pool = None
         self.lock = threading.Lock()
         
+        # Open connection count and FIFO waiters, both guarded by self.lock
+        self._open_count = 0
+        self._waiters = deque()
+        self._stop_pruner = threading.Event()
+        
+        # Build the DSQL client once - client construction loads botocore service models
+        self._dsql_client = boto3.client('dsql', region_name=region)
+        # Cached (token, expiry) pair, guarded by self.lock
+        self._token_cache = (None, 0.0)
+        
+        # Server-side prepared statement name for each configured query type
+        self.prepared_statements = {query_type: f"q_{query_type}" for query_type in CONFIG['queries']}
+        
         # Initialize the pool
         self._create_pool()
         
-        logger.info(f"[POOL] Initialized DSQL connection pool (min={CONFIG['connection_pool']['min_connections']}, max={CONFIG['connection_pool']['max_connections']})")
+        # Probe idle connections in the background so get_connection never has to.
+        # A non-positive interval disables the pruner; waiting 0s would spin it in a tight loop.
+        self._pruner = None
+        if _POOL_PRUNE_INTERVAL > 0:
+            self._pruner = threading.Thread(target=self._prune_idle_connections, name='dsql-pool-pruner', daemon=True)
+            self._pruner.start()
+        else:
+            logger.info("[POOL] Idle connection pruning disabled (DSQL_POOL_PRUNE_INTERVAL <= 0)")
+        
+        logger.info(f"[POOL] Initialized DSQL connection pool (min={_POOL_MIN}, max={_POOL_MAX})")
     
     def _generate_auth_token(self) -> str:
-        """Generate a fresh DSQL authentication token."""
+        """Return a DSQL authentication token, reusing the cached one while it is still fresh."""
         try:
-            # Generate new token
-            dsql_client = boto3.client('dsql', region_name=self.region)
-            password_token = dsql_client.generate_db_connect_admin_auth_token(
-                self.cluster_endpoint,
-                self.region
-            )
+            with self.lock:
+                token, expiry = self._token_cache
+                if token and time.monotonic() < expiry - TOKEN_REFRESH_MARGIN_SECONDS:
+                    return token
+                
+                # Generate new token
+                password_token = self._dsql_client.generate_db_connect_admin_auth_token(
+                    self.cluster_endpoint,
+                    self.region
+                )
+                self._token_cache = (password_token, time.monotonic() + TOKEN_CACHE_SECONDS)
             
-            logger.info(f"[POOL] Generated fresh auth token")
+            logger.info("[POOL] Generated fresh auth token")
             return password_token
         except Exception as e:
             logger.error(f"[POOL] Failed to generate auth token: {e}")
             raise
     
+    def _connect(self):
+        """Open a new DSQL connection; the auth token is shared until it nears expiry."""
+        return psycopg2.connect(
+            password=self._generate_auth_token(),
+            connection_factory=DSQLConnection,
+            **self.conn_params
+        )
+    
     def _create_pool(self):
-        """Create the psycopg2 connection pool with fresh token generation."""
+        """Create the idle connection queue and open the minimum number of connections."""
         try:
-            # Create a custom connection factory that generates fresh tokens
-            def connection_factory(*args, **kwargs):
-                # Generate fresh token for each connection
-                kwargs['password'] = self._generate_auth_token()
-                return psycopg2.connect(*args, **kwargs)
-            
-            # Connection parameters (without password - will be added by factory)
+            # Connection parameters (without password - will be added by _connect)
             self.conn_params = {
                 'dbname': CONFIG['dsql']['dbname'],
                 'user': CONFIG['dsql']['user'],
@@ -147,20 +262,115 @@ class DSQLConnectionPool:
             if CONFIG['dsql']['ssl_root_cert']:
                 self.conn_params['sslrootcert'] = CONFIG['dsql']['ssl_root_cert']
             
-            # Create threaded connection pool with custom connection factory
-            self.pool = psycopg2.pool.ThreadedConnectionPool(
-                minconn=CONFIG['connection_pool']['min_connections'],
-                maxconn=CONFIG['connection_pool']['max_connections'],
-                connection_factory=connection_factory,
-                **self.conn_params
-            )
+            self.pool = SimpleQueue()
+            if _POOL_MIN > 0:
+                # Open the minimum connections in parallel - each open is a TLS
+                # handshake plus authentication, and the first one signs the token
+                # that the rest reuse
+                with ThreadPoolExecutor(max_workers=_POOL_MIN) as executor:
+                    futures = [executor.submit(self._connect) for _ in range(_POOL_MIN)]
+                
+                errors = []
+                for future in futures:
+                    if future.exception():
+                        errors.append(future.exception())
+                        continue
+                    with self.lock:
+                        self._open_count += 1
+                    self.pool.put(future.result())
+                if errors:
+                    raise errors[0]
             
-            logger.info(f"[POOL] Created connection pool with fresh token generation")
+            logger.info(f"[POOL] Created connection pool with {self._open_count} idle connections")
             
         except Exception as e:
             logger.error(f"[POOL] Failed to create connection pool: {e}")
+            self.close_all()
+            raise
+    
+    def _acquire(self):
+        """
+        Take an idle connection, open a new one, or wait for one to be returned.
+        
+        Returns:
+            A database connection that has not been validated yet
+        """
+        # Fast path: an idle connection is available, no pool lock needed
+        try:
+            return self.pool.get_nowait()
+        except Empty:
+            pass
+        
+        with self.lock:
+            # A connection may have been returned since the fast path missed
+            try:
+                return self.pool.get_nowait()
+            except Empty:
+                pass
+            
+            if self._open_count < _POOL_MAX:
+                self._open_count += 1
+                waiter = None
+            else:
+                waiter = Future()
+                self._waiters.append(waiter)
+        
+        if waiter is not None:
+            try:
+                conn = waiter.result(timeout=_POOL_TIMEOUT)
+            except FutureTimeoutError:
+                with self.lock:
+                    if not waiter.done():
+                        self._waiters.remove(waiter)
+                        raise Exception("Timed out waiting for a pooled connection")
+                conn = waiter.result()
+            
+            # None means a slot was freed for us rather than a connection handed over
+            if conn is not None:
+                return conn
+        
+        try:
+            return self._connect()
+        except Exception:
+            self._release_slot()
             raise
     
+    def _release_slot(self):
+        """Give a freed connection slot to the oldest waiter, or shrink the open count."""
+        with self.lock:
+            if self._waiters:
+                self._waiters.popleft().set_result(None)
+            else:
+                self._open_count -= 1
+    
+    def _discard(self, conn):
+        """Close a connection that is no longer usable and free its slot."""
+        try:
+            conn.close()
+        except Exception:
+            pass
+        self._release_slot()
+    
+    def prepare(self, conn, query_type: str) -> Optional[str]:
+        """
+        Prepare the configured query for a query type on a connection, once per connection.
+        
+        Statements are prepared on first use rather than when the connection
+        opens, because the tables may not exist yet at that point.
+        
+        Args:
+            conn: A database connection from this pool
+            query_type: Key into CONFIG['queries']
+            
+        Returns:
+            The prepared statement name, or None if the query type is unknown
+        """
+        name = self.prepared_statements.get(query_type)
+        if name and name not in conn.prepared_statements:
+            conn.cached_cursor().execute(f"PREPARE {name} AS {CONFIG['queries'][query_type].rstrip().rstrip(';')}")
+            conn.prepared_statements.add(name)
+        return name
+    
     def get_connection(self):
         """
         Get a connection from the pool.
@@ -172,48 +382,59 @@ class DSQLConnectionPool:
             if not self.pool:
                 raise Exception("Connection pool not initialized")
             
-            # Get connection from pool - fresh token is generated for each new connection
-            conn = self.pool.getconn()
-            
-            if conn:
+            while True:
+                conn = self._acquire()
+                
                 # Test the connection
                 if self._test_connection(conn):
-                    logger.debug(f"[POOL] Retrieved valid connection from pool")
-                    return conn
-                else:
-                    # Connection is invalid, return it and get a new one
-                    logger.debug(f"[POOL] Connection invalid, getting fresh connection")
-                    self.pool.putconn(conn, close=True)
-                    conn = self.pool.getconn()
+                    logger.debug("[POOL] Retrieved valid connection from pool")
                     return conn
-            else:
-                raise Exception("Failed to get connection from pool")
+                
+                # Connection is invalid, drop it and get a fresh one
+                logger.debug("[POOL] Connection invalid, getting fresh connection")
+                self._discard(conn)
                 
         except Exception as e:
             logger.error(f"[POOL] Error getting connection: {e}")
             raise
     
-    def return_connection(self, conn):
+    def return_connection(self, conn, close: bool = False):
         """
         Return a connection to the pool.
         
         Args:
             conn: The database connection to return
+            close: Close the connection instead of keeping it for reuse
         """
         try:
             if conn and self.pool:
+                if close or conn.closed:
+                    self._discard(conn)
+                    return
+                
                 # Reset connection state
-                if not conn.closed:
-                    conn.rollback()
-                self.pool.putconn(conn)
-                logger.debug(f"[POOL] Returned connection to pool")
+                conn.rollback()
+                
+                # Hand the connection straight to the oldest waiter, if any
+                with self.lock:
+                    if self._waiters:
+                        self._waiters.popleft().set_result(conn)
+                    else:
+                        self.pool.put(conn)
+                logger.debug("[POOL] Returned connection to pool")
+            elif conn:
+                conn.close()
         except Exception as e:
             logger.warning(f"[POOL] Error returning connection to pool: {e}")
+            self._discard(conn)
     
     def _test_connection(self, conn) -> bool:
         """
         Test if a connection is still valid.
         
+        Only checks client-side state so no round-trip is made; a connection
+        the server has dropped surfaces as an error on its next query.
+        
         Args:
             conn: The database connection to test
             
@@ -221,23 +442,53 @@ class DSQLConnectionPool:
             True if connection is valid, False otherwise
         """
         try:
-            if conn.closed:
-                return False
-            
-            # Quick test query
-            cur = conn.cursor()
-            cur.execute("SELECT 1")
-            cur.fetchone()
-            cur.close()
-            return True
+            return (
+                not conn.closed
+                and conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+            )
         except Exception:
             return False
     
+    def _prune_idle_connections(self):
+        """Periodically run SELECT 1 on idle connections and drop the ones that fail."""
+        while not self._stop_pruner.wait(_POOL_PRUNE_INTERVAL):
+            idle = self.pool
+            if not idle:
+                return
+            
+            # Only probe connections that were idle when this pass started
+            for _ in range(idle.qsize()):
+                try:
+                    conn = idle.get_nowait()
+                except Empty:
+                    break
+                
+                try:
+                    cur = conn.cached_cursor()
+                    cur.execute("SELECT 1")
+                    cur.fetchone()
+                except Exception:
+                    logger.debug("[POOL] Pruned dead idle connection")
+                    self.return_connection(conn, close=True)
+                    continue
+                self.return_connection(conn)
+    
     def close_all(self):
         """Close all connections in the pool."""
         try:
-            if self.pool:
-                self.pool.closeall()
+            self._stop_pruner.set()
+            idle, self.pool = self.pool, None
+            with self.lock:
+                waiters, self._waiters = self._waiters, deque()
+            for waiter in waiters:
+                waiter.set_exception(Exception("Connection pool closed"))
+            
+            if idle:
+                while True:
+                    try:
+                        idle.get_nowait().close()
+                    except Empty:
+                        break
                 logger.info("[POOL] Closed all connections in pool")
         except Exception as e:
             logger.warning(f"[POOL] Error closing connection pool: {e}")
@@ -263,21 +514,37 @@ def get_dsql_connection_pool(cluster_endpoint: str, region: str) -> DSQLConnecti
 
 
 def create_valkey_client(valkey_endpoint: str) -> redis.Redis:
-    """Create and return a Valkey client."""
+    """
+    Create and return a Valkey client.
+    
+    The client is kept for the life of the process, so repeated main() calls
+    against the same endpoint skip the TLS handshake and PING. Its connection
+    pool lets concurrent callers share sockets.
+    """
+    global valkey_client, valkey_client_endpoint
+    
+    if valkey_client is not None and valkey_client_endpoint == valkey_endpoint:
+        return valkey_client
+    
     try:
-        # Create TLS connection (matches valkey-cli --tls method)
-        client = redis.Redis(
+        # Create TLS connection pool (matches valkey-cli --tls method)
+        connection_pool = redis.ConnectionPool(
+            connection_class=redis.SSLConnection,
             host=valkey_endpoint,
             port=6379,
-            ssl=True,
             ssl_check_hostname=False,
             ssl_cert_reqs=None,
             socket_connect_timeout=10,
             socket_timeout=10
         )
+        client = redis.Redis(connection_pool=connection_pool)
         # Test connection
         client.ping()
         logger.info(f"[OK] Successfully connected to Valkey at {valkey_endpoint}")
+        if not HIREDIS_AVAILABLE:
+            logger.warning("[VALKEY] hiredis not installed, using the pure-Python response parser")
+        
+        valkey_client, valkey_client_endpoint = client, valkey_endpoint
         return client
     except redis.RedisError as e:
         logger.error(f"[ERROR] Error connecting to Valkey: {e}")
@@ -293,52 +560,67 @@ def get_dsql_client(region: str) -> boto3.client:
         raise
 
 
-def execute_dsql_query(cluster_endpoint: str, query: str) -> Tuple[float, Any]:
+def execute_dsql_query(cluster_endpoint: str, query: str, query_type: Optional[str] = None) -> Tuple[int, bytes]:
     """
     Execute a query against DSQL using connection pooling and measure execution time.
     
+    Pooled connections are not probed before use, so if the server has dropped
+    one the query is retried once on a fresh connection.
+    
     Args:
         cluster_endpoint: The DSQL cluster endpoint
         query: The SQL query to execute
+        query_type: Configured query type; when given, the query runs as a
+            server-side prepared statement so DSQL skips parse and plan
         
     Returns:
-        Tuple containing (execution_time_delta, query_results)
+        Tuple containing (execution_time_ns, pickled_query_results)
     """
     try:
         # Get connection pool
-        pool = get_dsql_connection_pool(cluster_endpoint, CONFIG['dsql']['region'])
-        
-        # Get connection from pool
-        conn = pool.get_connection()
+        pool = get_dsql_connection_pool(cluster_endpoint, _REGION)
         
-        logger.info(f"[CONNECT] Using pooled connection to DSQL cluster: {cluster_endpoint}")
-        
-        try:
-            # Execute query and measure time
-            cur = conn.cursor()
-            start = datetime.datetime.now()
-            logger.info(f"[QUERY] Executing query in DSQL: {query}")
-            logger.info(f"[TIME] Query start time: {start}")
-            
-            cur.execute(query)
-            data = cur.fetchall()
-            
-            end = datetime.datetime.now()
-            delta = end - start
-            logger.info(f"[TIME] Query end time: {end}")
-            logger.info(f"[TIME] DSQL execution time: {delta}")
-            
-            # Format result for cache storage
-            result_str = ''.join(str(v) for v in data).replace('(', '').replace(')', '')
+        for attempt in range(2):
+            # Get connection from pool
+            conn = pool.get_connection()
             
-            cur.close()
-            logger.info(f"[OK] Successfully executed DSQL query using connection pool, returned {len(data)} rows")
-            
-            return delta, result_str
+            logger.info("[CONNECT] Using pooled connection to DSQL cluster: %s", cluster_endpoint)
             
-        finally:
-            # Always return connection to pool
-            pool.return_connection(conn)
+            try:
+                # Preparing happens once per connection, outside the timed region
+                statement = pool.prepare(conn, query_type) if query_type else None
+                
+                # Execute query and measure time
+                cur = conn.cached_cursor()
+                # Log before starting the clock so logging is not counted as DSQL time
+                logger.info("[QUERY] Executing query in DSQL: %s", query)
+                start = time.perf_counter_ns()
+                
+                cur.execute(f"EXECUTE {statement}" if statement else query)
+                data = cur.fetchall()
+                
+                delta_ns = time.perf_counter_ns() - start
+                logger.info("[TIME] DSQL execution time: %.3fms", delta_ns / NS_PER_MS)
+                
+                # Serialize result for cache storage in a single C-level pass
+                result_bytes = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+                
+                logger.info("[OK] Successfully executed DSQL query using connection pool, returned %d rows", len(data))
+                
+                return delta_ns, result_bytes
+                
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                # Broken connection - drop it and retry once with a fresh one
+                pool.return_connection(conn, close=True)
+                conn = None
+                if attempt:
+                    raise
+                logger.warning("[POOL] Pooled connection failed (%s), retrying with a fresh connection", e)
+                
+            finally:
+                # Always return connection to pool
+                if conn is not None:
+                    pool.return_connection(conn)
         
     except psycopg2.Error as e:
         logger.error(f"[ERROR] PostgreSQL Error: {e}")
@@ -348,7 +630,85 @@ def execute_dsql_query(cluster_endpoint: str, query: str) -> Tuple[float, Any]:
         raise
 
 
-def get_from_cache(cache: redis.Redis, key: str) -> Tuple[Optional[str], datetime.timedelta, Optional[datetime.timedelta]]:
+@functools.lru_cache(maxsize=32)
+def cache_key(query: str) -> str:
+    """
+    Build a short, fixed-length Valkey key for a query.
+    
+    Keys are a 128-bit BLAKE2b digest of the SQL text, so each cache
+    operation sends 37 bytes instead of the full query.
+    
+    Args:
+        query: The SQL query text
+        
+    Returns:
+        Cache key of the form 'dsql:<32 hex chars>'
+    """
+    return 'dsql:' + hashlib.blake2b(query.encode(), digest_size=16).hexdigest()
+
+
+def table_version_key(table: str) -> str:
+    """Return the Valkey key holding the version counter for a table."""
+    return f"dsql:ver:{table}"
+
+
+def versioned_cache_key(cache: redis.Redis, query: str, tables: List[str]) -> str:
+    """
+    Build the cache key for a query at the current version of the tables it reads.
+    
+    Args:
+        cache: Valkey client
+        query: The SQL query text
+        tables: Tables the query reads
+        
+    Returns:
+        Cache key of the form 'dsql:<query hash>:<version of each table>'
+    """
+    if not tables:
+        return cache_key(query)
+    versions = cache.mget([table_version_key(table) for table in tables])
+    return f"{cache_key(query)}:" + ":".join((version or b'0').decode() for version in versions)
+
+
+def bump_table_version(cache: redis.Redis, table: str) -> int:
+    """
+    Invalidate every cached query that reads a table. Call after writing to it.
+    
+    Entries for the old version are no longer looked up and expire through their TTL.
+    
+    Args:
+        cache: Valkey client
+        table: Table that was written to
+        
+    Returns:
+        The table's new version
+    """
+    version = cache.incr(table_version_key(table))
+    logger.info(f"[CACHE] Bumped {table} to version {version}")
+    return version
+
+
+def decode_cache_fields(result: Optional[bytes], dsql_time: Optional[bytes]) -> Tuple[Optional[bytes], Optional[int]]:
+    """
+    Convert the fields of a cached hash into the query result and original DSQL time.
+    
+    Args:
+        result: Value of the result field, or None on a cache miss
+        dsql_time: Value of the DSQL time field
+        
+    Returns:
+        Tuple of (query_result_or_None, original_dsql_time_ns_or_None)
+    """
+    if not result:
+        return None, None
+    
+    query_result = result[1:]
+    if result[:1] == CACHE_FORMAT_LZ4:
+        query_result = lz4.frame.decompress(query_result)
+    return query_result, int(dsql_time) if dsql_time is not None else None
+
+
+def get_from_cache(cache: redis.Redis, key: str) -> Tuple[Optional[bytes], int, Optional[int]]:
     """
     Try to get result from cache and measure access time.
     
@@ -357,49 +717,118 @@ def get_from_cache(cache: redis.Redis, key: str) -> Tuple[Optional[str], datetim
         key: Cache key to look up
         
     Returns:
-        Tuple of (result_or_None, cache_access_time, original_dsql_time_or_None)
-        - If cache hit: (result, cache_time, original_dsql_time)
-        - If cache miss: (None, cache_time, None)
+        Tuple of (result_or_None, cache_access_time_ns, original_dsql_time_ns_or_None)
+        - If cache hit: (result, cache_time_ns, original_dsql_time_ns)
+        - If cache miss: (None, cache_time_ns, None)
     """
-    start = datetime.datetime.now()
-    result = cache.get(key)
-    end = datetime.datetime.now()
-    delta = end - start
+    start = time.perf_counter_ns()
+    result, dsql_time = cache.hmget(key, CACHE_RESULT_FIELD, CACHE_DSQL_TIME_FIELD)
+    delta_ns = time.perf_counter_ns() - start
     
     if result:
-        logger.info(f"[CACHE HIT] Retrieved data in {delta}")
-        import json
-        cache_data = json.loads(result.decode())
-        query_result = cache_data['result']
-        dsql_time_seconds = cache_data['dsql_time_seconds']
-        original_dsql_time = datetime.timedelta(seconds=dsql_time_seconds)
-        logger.info(f"[TIMING] Retrieved original DSQL time: {original_dsql_time}")
-        return query_result, delta, original_dsql_time
+        logger.info("[CACHE HIT] Retrieved data in %.3fms", delta_ns / NS_PER_MS)
+        query_result, original_dsql_time_ns = decode_cache_fields(result, dsql_time)
+        logger.info("[TIMING] Retrieved original DSQL time: %.3fms", original_dsql_time_ns / NS_PER_MS)
+        return query_result, delta_ns, original_dsql_time_ns
     else:
-        logger.info(f"[CACHE MISS] Cache access time: {delta}")
-    return None, delta, None
+        logger.info("[CACHE MISS] Cache access time: %.3fms", delta_ns / NS_PER_MS)
+    return None, delta_ns, None
+
+
+def get_many_from_cache(cache: redis.Redis, key: str, count: int) -> List[Tuple[Optional[bytes], int, Optional[int]]]:
+    """
+    Look up a key count times in a single pipelined round-trip.
+    
+    The pipeline's total time is split evenly across the lookups, which shows
+    the per-lookup cost once network latency is shared.
+    
+    Args:
+        cache: Valkey client
+        key: Cache key to look up
+        count: Number of lookups to batch
+        
+    Returns:
+        One (result_or_None, cache_access_time_ns, original_dsql_time_ns_or_None)
+        tuple per lookup, as returned by get_from_cache
+    """
+    pipe = cache.pipeline(transaction=False)
+    for _ in range(count):
+        pipe.hmget(key, CACHE_RESULT_FIELD, CACHE_DSQL_TIME_FIELD)
+    
+    start = time.perf_counter_ns()
+    results = pipe.execute()
+    total_ns = time.perf_counter_ns() - start
+    delta_ns = total_ns // count
+    logger.info("[CACHE PIPELINE] Retrieved %d lookups in %.3fms (%.3fms per lookup)", count, total_ns / NS_PER_MS, delta_ns / NS_PER_MS)
+    
+    lookups = []
+    for result, dsql_time in results:
+        if result:
+            query_result, original_dsql_time_ns = decode_cache_fields(result, dsql_time)
+            lookups.append((query_result, delta_ns, original_dsql_time_ns))
+        else:
+            lookups.append((None, delta_ns, None))
+    return lookups
+
+
+def warm_valkey_connections(cache: redis.Redis, count: int) -> None:
+    """
+    Open count pooled Valkey sockets up front so TCP+TLS setup is not timed as a lookup.
+    
+    Requires redis-py 5.3+, where get_connection() takes no command name.
+    """
+    pool = cache.connection_pool
+    connections = [pool.get_connection() for _ in range(count)]
+    for connection in connections:
+        pool.release(connection)
+
+
+def measure_concurrent_throughput(cache: redis.Redis, cluster_endpoint: str, key: str, query: str,
+                                  query_type: Optional[str], count: int, workers: int) -> Tuple[int, int]:
+    """
+    Run count lookups across workers threads and time the whole batch.
+    
+    Each worker reads through get_or_refresh, so workers that miss the same key
+    share one DSQL refresh. Per-thread timings would include GIL contention, so
+    only the wall time of the batch is measured and reported as throughput.
+    
+    Returns:
+        Tuple of (cache_hits, wall_time_ns)
+    """
+    warm_valkey_connections(cache, workers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        start = time.perf_counter_ns()
+        lookups = list(executor.map(
+            lambda _: get_or_refresh(cache, cluster_endpoint, key, query, query_type), range(count)
+        ))
+        wall_ns = time.perf_counter_ns() - start
+    hits = sum(1 for _, was_hit in lookups if was_hit)
+    return hits, wall_ns
 
 
-def print_performance_summary(cache_time: datetime.timedelta, dsql_time: datetime.timedelta):
+def print_performance_summary(cache_time_ns: int, dsql_time_ns: int):
     """Print a nice performance comparison summary."""
+    cache_ms = cache_time_ns / NS_PER_MS
+    dsql_ms = dsql_time_ns / NS_PER_MS
+    
     print("\n" + "="*60)
     print("PERFORMANCE COMPARISON SUMMARY")
     print("="*60)
-    print(f"DSQL query time:        {dsql_time}")
-    print(f"Cache access time:      {cache_time}")
+    print(f"DSQL query time:        {dsql_ms:.3f}ms")
+    print(f"Cache access time:      {cache_ms:.3f}ms")
     
-    if cache_time.total_seconds() > 0:
-        speedup = dsql_time.total_seconds() / cache_time.total_seconds()
+    if cache_ms > 0:
+        speedup = dsql_ms / cache_ms
         print(f"Cache speedup:          {speedup:.2f}x faster")
         
         # Calculate percentage improvement
-        improvement = ((dsql_time.total_seconds() - cache_time.total_seconds()) / dsql_time.total_seconds()) * 100
+        improvement = ((dsql_ms - cache_ms) / dsql_ms) * 100
         print(f"Performance improvement: {improvement:.1f}%")
     
     print("="*60)
 
 
-def hydrate_cache(cache: redis.Redis, key: str, value: str, dsql_time: datetime.timedelta, ttl: int) -> None:
+def hydrate_cache(cache: redis.Redis, key: str, value: bytes, dsql_time_ns: int, ttl: int) -> None:
     """
     Store data in the Valkey cache with a specified TTL, including DSQL timing metadata.
 
@@ -407,52 +836,123 @@ def hydrate_cache(cache: redis.Redis, key: str, value: str, dsql_time: datetime.
         cache: Valkey client
         key: Cache key to store the data under
         value: Data to store in the cache
-        dsql_time: The original DSQL query execution time
+        dsql_time_ns: The original DSQL query execution time in nanoseconds
         ttl: Time-to-live in seconds
     """
     try:
-        # Store both the result and the DSQL timing as JSON
-        import json
-        cache_data = {
-            'result': value,
-            'dsql_time_seconds': dsql_time.total_seconds()
-        }
-        cache.setex(key, ttl, json.dumps(cache_data))
-        logger.info(f"[OK] Cache hydration successful for key '{key}'")
-        logger.info(f"[TTL] Data will expire after {ttl} seconds")
-        logger.info(f"[TIMING] Stored DSQL time: {dsql_time} ({dsql_time.total_seconds():.4f}s)")
+        # Compress larger results; the flag byte records which format was used
+        if len(value) >= CACHE_COMPRESS_MIN_BYTES:
+            stored = CACHE_FORMAT_LZ4 + lz4.frame.compress(value)
+        else:
+            stored = CACHE_FORMAT_RAW + value
+        
+        # Store the result and the DSQL timing as hash fields, set with the TTL in one MULTI
+        pipe = cache.pipeline()
+        pipe.hset(key, mapping={CACHE_RESULT_FIELD: stored, CACHE_DSQL_TIME_FIELD: dsql_time_ns})
+        pipe.expire(key, ttl)
+        pipe.execute()
+        logger.info("[OK] Cache hydration successful for key '%s' (%d bytes stored)", key, len(stored))
+        logger.info("[TTL] Data will expire after %d seconds", ttl)
+        logger.info("[TIMING] Stored DSQL time: %.3fms", dsql_time_ns / NS_PER_MS)
     except redis.RedisError as e:
         logger.error(f"[ERROR] Failed to hydrate cache: {e}")
         raise
 
 
-def main(cluster_endpoint: str, valkey_endpoint: str, query_type: str) -> dict:
+def refresh_cache(cache: redis.Redis, cluster_endpoint: str, key: str, query: str, query_type: Optional[str] = None) -> Tuple[Optional[int], Optional[bytes]]:
+    """
+    Run a query against DSQL and hydrate the cache with its result.
+    
+    Concurrent refreshes of the same key are coalesced: the first caller runs
+    the query while the others wait for it and then read the fresh entry from
+    Valkey, so an expired key costs one DSQL execution rather than one per thread.
+    
+    Args:
+        cache: Valkey client
+        cluster_endpoint: The DSQL cluster endpoint
+        key: Cache key to hydrate
+        query: The SQL query to execute
+        query_type: Configured query type, passed to execute_dsql_query
+        
+    Returns:
+        Tuple containing (dsql_time_ns, pickled_query_results)
+    """
+    with _inflight_lock:
+        event = _inflight.get(key)
+        leader = event is None
+        if leader:
+            event = _inflight[key] = threading.Event()
+    
+    if not leader:
+        logger.info("[SINGLE-FLIGHT] Waiting for in-progress refresh of '%s'", key)
+        event.wait()
+        result, _, dsql_time_ns = get_from_cache(cache, key)
+        if result is None:
+            # The refresh we waited on failed - try it ourselves
+            return refresh_cache(cache, cluster_endpoint, key, query, query_type)
+        return dsql_time_ns, result
+    
+    try:
+        dsql_time_ns, result = execute_dsql_query(cluster_endpoint, query, query_type)
+        hydrate_cache(cache, key, result, dsql_time_ns, _TTL)
+        return dsql_time_ns, result
+    finally:
+        with _inflight_lock:
+            del _inflight[key]
+        event.set()
+
+
+def get_or_refresh(cache: redis.Redis, cluster_endpoint: str, key: str, query: str, query_type: Optional[str] = None) -> Tuple[bytes, bool]:
+    """
+    Read a key from the cache, refreshing it from DSQL on a miss.
+    
+    Misses go through refresh_cache, so concurrent callers missing the same
+    key wait for a single DSQL execution.
+    
+    Returns:
+        Tuple of (pickled_query_results, was_cache_hit)
+    """
+    result, _, _ = get_from_cache(cache, key)
+    if result is not None:
+        return result, True
+    _, result = refresh_cache(cache, cluster_endpoint, key, query, query_type)
+    return result, False
+
+
+def main(cluster_endpoint: str, valkey_endpoint: str, query_type: str, batch_hits: bool = False, concurrent: bool = False) -> dict:
     """
     Main function to demonstrate caching with ElastiCache and DSQL.
     
     Runs complete demo in one execution:
     - Iteration 1: Cache miss, executes DSQL query, hydrates cache
     - Iterations 2-10: Cache hits, demonstrates performance improvement
+    - Optionally, a concurrent burst of lookups reported as throughput
     
     Args:
         cluster_endpoint: DSQL cluster endpoint
         valkey_endpoint: ElastiCache Valkey endpoint
         query_type: 'simple' or 'complex'
+        batch_hits: Pipeline the cache-hit lookups into one Valkey round-trip
+            and report the per-lookup share of its time
+        concurrent: After the timed iterations, run a burst of lookups across
+            threads and report its throughput separately
         
     Returns:
         Dictionary with performance metrics for summary
     """
     # Select query based on query type
     query = CONFIG['queries'].get(query_type, CONFIG['queries']['complex'])
+    tables = CONFIG['query_tables'].get(query_type, CONFIG['query_tables']['complex'])
     
     num_cache_hits = 9
-    cache_hit_times = []
-    cache_miss_time = None
+    num_concurrent_lookups = 100
+    cache_hit_times = []  # nanoseconds
+    cache_miss_time = None  # nanoseconds
     
     print("\n[START] Starting DSQL ElastiCache Performance Demo with Connection Pooling")
     print(f"DSQL Endpoint: {cluster_endpoint}")
     print(f"Valkey Endpoint: {valkey_endpoint}")
-    print(f"Connection Pool: min={CONFIG['connection_pool']['min_connections']}, max={CONFIG['connection_pool']['max_connections']}")
+    print(f"Connection Pool: min={_POOL_MIN}, max={_POOL_MAX}")
     print(f"Query Type: {query_type.upper()}")
     print(f"Query: {query}")
     print("-" * 60)
@@ -461,36 +961,39 @@ def main(cluster_endpoint: str, valkey_endpoint: str, query_type: str) -> dict:
         # Initialize Valkey client
         cache = create_valkey_client(valkey_endpoint)
         
-        # Always start fresh - clear any existing cache for this demo
-        print("\n[CLEAR] Clearing cache to start fresh demo...")
-        try:
-            cache.delete(query)
-            print("[OK] Cache cleared")
-        except:
-            print("[INFO] No existing cache to clear")
+        # The key tracks the versions of the tables the query reads, so there is
+        # no need to clear old entries - iteration 1 always refreshes from DSQL
+        key = versioned_cache_key(cache, query, tables)
+        print(f"Cache Key: {key}")
         
         # ITERATION 1: Cache Miss (Execute DSQL)
         print("\n[CACHE MISS - ITERATION 1/10]")
         sys.stdout.flush()
-        dsql_time, result = execute_dsql_query(cluster_endpoint, query)
+        dsql_time, result = refresh_cache(cache, cluster_endpoint, key, query, query_type)
         cache_miss_time = dsql_time
-        hydrate_cache(cache, query, result, dsql_time, CONFIG['valkey']['ttl'])
-        print(f"[INFO] Cache hydrated. DSQL time: {cache_miss_time}")
+        print(f"[INFO] Cache hydrated. DSQL time: {cache_miss_time / NS_PER_MS:.3f}ms")
         sys.stdout.flush()
         
         # ITERATIONS 2-10: Cache Hits
+        if batch_hits:
+            lookups = get_many_from_cache(cache, key, num_cache_hits)
+        else:
+            lookups = None
         for i in range(2, num_cache_hits + 2):
             print(f"\n[CACHE HIT - ITERATION {i}/10]")
             sys.stdout.flush()
-            cache_result, cache_time, original_dsql_time = get_from_cache(cache, query)
+            if lookups:
+                cache_result, cache_time, original_dsql_time = lookups[i - 2]
+            else:
+                cache_result, cache_time, original_dsql_time = get_from_cache(cache, key)
             if cache_result:
                 print("[OK] Query result fetched from ElastiCache")
-                print(f"Cache access time: {cache_time}")
+                print(f"Cache access time: {cache_time / NS_PER_MS:.3f}ms")
                 sys.stdout.flush()
                 cache_hit_times.append(cache_time)
                 if original_dsql_time:
-                    speedup = original_dsql_time.total_seconds() / cache_time.total_seconds()
-                    improvement = ((original_dsql_time.total_seconds() - cache_time.total_seconds()) / original_dsql_time.total_seconds()) * 100
+                    speedup = original_dsql_time / cache_time
+                    improvement = ((original_dsql_time - cache_time) / original_dsql_time) * 100
                     print(f"Speedup: {speedup:.2f}x faster | Improvement: {improvement:.1f}%")
                 else:
                     print("[WARNING] Original DSQL time not found in cache")
@@ -498,45 +1001,63 @@ def main(cluster_endpoint: str, valkey_endpoint: str, query_type: str) -> dict:
             else:
                 print("[WARNING] Unexpected cache miss during hit iterations. Rehydrating...")
                 sys.stdout.flush()
-                dsql_time, result = execute_dsql_query(cluster_endpoint, query)
-                hydrate_cache(cache, query, result, dsql_time, CONFIG['valkey']['ttl'])
+                refresh_cache(cache, cluster_endpoint, key, query, query_type)
+        
+        # Optional concurrent burst, kept out of the per-lookup latency figures above
+        throughput = None
+        if concurrent:
+            workers = min(num_concurrent_lookups, _POOL_MAX)
+            print(f"\n[CONCURRENT] {num_concurrent_lookups} lookups across {workers} threads")
+            sys.stdout.flush()
+            concurrent_hits, wall_ns = measure_concurrent_throughput(
+                cache, cluster_endpoint, key, query, query_type, num_concurrent_lookups, workers
+            )
+            throughput = num_concurrent_lookups * NS_PER_SECOND / wall_ns
         
         # Print comprehensive summary
         print("\n" + "="*60)
         print("PERFORMANCE SUMMARY - COMPLETE DEMO WITH CONNECTION POOLING")
         print("="*60)
         if cache_miss_time:
-            print(f"Cache Miss (DSQL):            {cache_miss_time.total_seconds():.6f}s ({cache_miss_time.total_seconds()*1000:.1f}ms)")
+            print(f"Cache Miss (DSQL):            {cache_miss_time / NS_PER_SECOND:.6f}s ({cache_miss_time / NS_PER_MS:.1f}ms)")
         if cache_hit_times:
-            avg_cache_hit = sum(t.total_seconds() for t in cache_hit_times) / len(cache_hit_times)
-            min_cache_hit = min(t.total_seconds() for t in cache_hit_times)
-            max_cache_hit = max(t.total_seconds() for t in cache_hit_times)
+            avg_cache_hit = sum(cache_hit_times) / len(cache_hit_times) / NS_PER_SECOND
+            min_cache_hit = min(cache_hit_times) / NS_PER_SECOND
+            max_cache_hit = max(cache_hit_times) / NS_PER_SECOND
             print(f"\nCache Hits ({len(cache_hit_times)} iterations):")
             print(f"  Average:  {avg_cache_hit:.6f}s ({avg_cache_hit*1000:.1f}ms)")
             print(f"  Min:      {min_cache_hit:.6f}s ({min_cache_hit*1000:.1f}ms)")
             print(f"  Max:      {max_cache_hit:.6f}s ({max_cache_hit*1000:.1f}ms)")
             
             if cache_miss_time:
-                speedup = cache_miss_time.total_seconds() / avg_cache_hit
-                improvement = ((cache_miss_time.total_seconds() - avg_cache_hit) / cache_miss_time.total_seconds()) * 100
+                cache_miss_seconds = cache_miss_time / NS_PER_SECOND
+                speedup = cache_miss_seconds / avg_cache_hit
+                improvement = ((cache_miss_seconds - avg_cache_hit) / cache_miss_seconds) * 100
                 print(f"\n" + "-"*60)
                 print(f"PERFORMANCE IMPROVEMENT:")
-                print(f"  DSQL:     {cache_miss_time.total_seconds()*1000:.1f}ms")
+                print(f"  DSQL:     {cache_miss_time / NS_PER_MS:.1f}ms")
                 print(f"  Cache:    {avg_cache_hit*1000:.1f}ms")
                 print(f"  Speedup:  {speedup:.1f}x faster")
                 print(f"  Improvement: {improvement:.1f}%")
+        if throughput is not None:
+            print(f"\nConcurrent Throughput ({workers} threads):")
+            print(f"  {num_concurrent_lookups} lookups ({concurrent_hits} hits) in {wall_ns / NS_PER_MS:.1f}ms")
+            print(f"  Throughput: {throughput:.0f} lookups/s")
         print("="*60)
         sys.stdout.flush()
         
         # Return performance metrics for summary
-        return {
-            'dsql_time_ms': round(cache_miss_time.total_seconds() * 1000, 1),
+        metrics = {
+            'dsql_time_ms': round(cache_miss_time / NS_PER_MS, 1),
             'cache_avg_ms': round(avg_cache_hit * 1000, 1),
             'cache_min_ms': round(min_cache_hit * 1000, 1),
             'cache_max_ms': round(max_cache_hit * 1000, 1),
             'speedup': round(speedup, 1),
             'improvement': round(improvement, 1)
         }
+        if throughput is not None:
+            metrics['cache_throughput_per_s'] = round(throughput)
+        return metrics
         
     except Exception as e:
         logger.error(f"[ERROR] Error in main function: {e}")
@@ -597,13 +1118,15 @@ def prompt_query_type() -> str:
             print("[ERROR] Invalid choice. Please enter 1 or 2.")
 
 
-def setup_users1_table(cluster_endpoint: str, region: str) -> bool:
+def setup_users1_table(cluster_endpoint: str, region: str, valkey_endpoint: Optional[str] = None) -> bool:
     """
     Create and populate the users1 table for simple query testing.
     
     Args:
         cluster_endpoint: DSQL cluster endpoint
         region: AWS region
+        valkey_endpoint: ElastiCache Valkey endpoint; when given, the users1
+            version is bumped after rows are inserted so cached results are not stale
         
     Returns:
         True if successful, False otherwise
@@ -618,23 +1141,20 @@ def setup_users1_table(cluster_endpoint: str, region: str) -> bool:
         try:
             cur = conn.cursor()
             
-            # Check if table already exists
+            # Check if table already exists - counting rows answers both questions
+            # in one round-trip, a missing table surfaces as UndefinedTable
             print("[CHECK] Checking if users1 table exists...")
-            cur.execute("""
-                SELECT EXISTS (
-                    SELECT FROM information_schema.tables 
-                    WHERE table_schema = 'public' 
-                    AND table_name = 'users1'
-                );
-            """)
-            table_exists = cur.fetchone()[0]
+            try:
+                cur.execute("SELECT COUNT(*) FROM users1;")
+                row_count = cur.fetchone()[0]
+                table_exists = True
+            except psycopg2.errors.UndefinedTable:
+                conn.rollback()
+                row_count = 0
+                table_exists = False
             
             if table_exists:
                 print("[EXISTS] users1 table already exists")
-                
-                # Check row count
-                cur.execute("SELECT COUNT(*) FROM users1;")
-                row_count = cur.fetchone()[0]
                 print(f"[COUNT] Current row count: {row_count}")
                 
                 if row_count > 0:
@@ -661,39 +1181,49 @@ def setup_users1_table(cluster_endpoint: str, region: str) -> bool:
                 """
                 
                 cur.execute(create_table_sql)
+                # DSQL does not mix DDL and DML in one transaction
+                conn.commit()
                 print("[OK] users1 table created successfully")
             
             # Insert test data
             print("[INSERT] Inserting test data...")
             
-            insert_sql = """
-            INSERT INTO users1 (id, name, email, age, department, salary, hire_date, is_active) VALUES
-            (1, 'John Doe', 'john.doe@company.com', 30, 'Engineering', 75000.00, '2022-01-15', true),
-            (2, 'Jane Smith', 'jane.smith@company.com', 28, 'Marketing', 65000.00, '2022-02-20', true),
-            (3, 'Mike Johnson', 'mike.johnson@company.com', 35, 'Engineering', 85000.00, '2021-11-10', true),
-            (4, 'Sarah Wilson', 'sarah.wilson@company.com', 32, 'Sales', 70000.00, '2022-03-05', true),
-            (5, 'David Brown', 'david.brown@company.com', 29, 'Engineering', 78000.00, '2022-01-25', true),
-            (6, 'Lisa Garcia', 'lisa.garcia@company.com', 31, 'HR', 62000.00, '2022-04-12', true),
-            (7, 'Tom Davis', 'tom.davis@company.com', 27, 'Marketing', 58000.00, '2022-05-18', true),
-            (8, 'Emma Martinez', 'emma.martinez@company.com', 33, 'Engineering', 82000.00, '2021-12-08', true),
-            (9, 'Chris Anderson', 'chris.anderson@company.com', 26, 'Sales', 67000.00, '2022-06-22', true),
-            (10, 'Amy Taylor', 'amy.taylor@company.com', 34, 'Engineering', 88000.00, '2021-10-15', true)
-            ON CONFLICT (email) DO NOTHING;
-            """
+            test_data = [
+                (1, 'John Doe', 'john.doe@company.com', 30, 'Engineering', 75000.00, '2022-01-15', True),
+                (2, 'Jane Smith', 'jane.smith@company.com', 28, 'Marketing', 65000.00, '2022-02-20', True),
+                (3, 'Mike Johnson', 'mike.johnson@company.com', 35, 'Engineering', 85000.00, '2021-11-10', True),
+                (4, 'Sarah Wilson', 'sarah.wilson@company.com', 32, 'Sales', 70000.00, '2022-03-05', True),
+                (5, 'David Brown', 'david.brown@company.com', 29, 'Engineering', 78000.00, '2022-01-25', True),
+                (6, 'Lisa Garcia', 'lisa.garcia@company.com', 31, 'HR', 62000.00, '2022-04-12', True),
+                (7, 'Tom Davis', 'tom.davis@company.com', 27, 'Marketing', 58000.00, '2022-05-18', True),
+                (8, 'Emma Martinez', 'emma.martinez@company.com', 33, 'Engineering', 82000.00, '2021-12-08', True),
+                (9, 'Chris Anderson', 'chris.anderson@company.com', 26, 'Sales', 67000.00, '2022-06-22', True),
+                (10, 'Amy Taylor', 'amy.taylor@company.com', 34, 'Engineering', 88000.00, '2021-10-15', True),
+            ]
             
-            cur.execute(insert_sql)
+            # One multi-row INSERT; RETURNING gives the new rows so the total and
+            # the sample need no follow-up queries
+            inserted = psycopg2.extras.execute_values(
+                cur,
+                """
+                INSERT INTO users1 (id, name, email, age, department, salary, hire_date, is_active)
+                VALUES %s
+                ON CONFLICT (email) DO NOTHING
+                RETURNING id, name, email, department;
+                """,
+                test_data,
+                fetch=True
+            )
+            conn.commit()
             
-            # Check how many rows were inserted
-            cur.execute("SELECT COUNT(*) FROM users1;")
-            total_rows = cur.fetchone()[0]
+            total_rows = row_count + len(inserted)
+            if inserted and valkey_endpoint:
+                bump_table_version(create_valkey_client(valkey_endpoint), 'users1')
             print(f"[OK] Test data inserted successfully. Total rows: {total_rows}")
             
             # Show sample of the data
             print("\n[SAMPLE] Sample data from users1 table:")
-            cur.execute("SELECT id, name, email, department FROM users1 LIMIT 3;")
-            sample_data = cur.fetchall()
-            
-            for row in sample_data:
+            for row in inserted[:3]:
                 print(f"   ID: {row[0]}, Name: {row[1]}, Email: {row[2]}, Dept: {row[3]}")
             
             print(f"\n[READY] Database setup complete! Ready for performance testing.")
@@ -710,6 +1240,11 @@ def setup_users1_table(cluster_endpoint: str, region: str) -> bool:
 
 
 if __name__ == "__main__":
+    # Optional flags may appear anywhere; strip them before reading positional arguments
+    concurrent = '--concurrent' in sys.argv
+    batch_hits = '--batch-hits' in sys.argv
+    sys.argv = [arg for arg in sys.argv if arg not in ('--concurrent', '--batch-hits')]
+    
     # Check for command line arguments first
     if len(sys.argv) >= 3:
         # Support both old format (2 args) and new format (3+ args)
@@ -754,6 +1289,7 @@ if __name__ == "__main__":
     
     # Update CONFIG with the provided region
     CONFIG['dsql']['region'] = region
+    _REGION = region
     
     print(f"[START] DSQL ElastiCache Performance Test")
     print(f"Timestamp: {datetime.datetime.now()}")
@@ -764,7 +1300,7 @@ if __name__ == "__main__":
         
         # If simple execution, setup the users1 table
         if query_type == 'simple':
-            success = setup_users1_table(cluster_endpoint, region)
+            success = setup_users1_table(cluster_endpoint, region, valkey_endpoint)
             if not success:
                 print("\n[ERROR] Failed to setup database. Cannot proceed.")
                 sys.exit(1)
@@ -780,4 +1316,4 @@ if __name__ == "__main__":
         print(f"\n[AUTOMATED] Running in automated mode with query type: {query_type}")
     
     # Run the performance test
-    main(cluster_endpoint, valkey_endpoint, query_type)
+    main(cluster_endpoint, valkey_endpoint, query_type, batch_hits=batch_hits, concurrent=concurrent)
@@ -191,7 +191,7 @@ else
     done
 fi
 
-export VALKEY_TTL="30"
+export VALKEY_TTL="3600"
 export QUERY
 
 echo ""
@@ -208,8 +208,10 @@ echo "============================================================"
 echo ""
 
 echo "[DEPENDENCIES] Installing required packages..."
-echo "[INSTALL] Python packages: redis, psycopg2-binary, boto3"
-python3 -m pip install --user redis psycopg2-binary boto3 --quiet
+echo "[INSTALL] Python packages: redis>=5.3, hiredis, lz4, psycopg2-binary, boto3"
+# redis>=5.3 for ConnectionPool.get_connection() without a command name; the floor also
+# upgrades an older install that would otherwise be left in place
+python3 -m pip install --user "redis>=5.3" hiredis lz4 psycopg2-binary boto3 --quiet
 echo "[OK] Python dependencies installed"
 echo ""
 
@@ -5,19 +5,22 @@ Creates the users1 table and populates it with test data for the ElastiCache dem
 """
 
 import os
+import io
+import csv
+import json
 import sys
+import time
+import struct
+import decimal
 import logging
 import datetime
 import warnings
+from contextlib import closing
 
-# Suppress Python deprecation warnings from boto3
-warnings.filterwarnings('ignore', category=Warning)
-
-# Packages installed by quick_start.sh
-
-import boto3
-import psycopg2
-from botocore.exceptions import ClientError
+# Packages installed by quick_start.sh. They are imported on the first connect
+# (see load_drivers) so --help and argument errors don't pay for loading botocore.
+boto3 = None
+psycopg2 = None
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -31,18 +34,70 @@ CONFIG = {
         'user': 'admin',
         'ssl_mode': 'prefer',  # Use prefer for CloudShell compatibility
         'ssl_root_cert': None,  # Don't specify cert path for CloudShell
+        # Detect a silently dropped connection in ~60s instead of TCP's 2-hour default
+        'keepalives_idle': 30,
+        'keepalives_interval': 10,
+        'keepalives_count': 3,
+        'statement_timeout_ms': int(os.environ.get('DSQL_STATEMENT_TIMEOUT_MS', '30000')),
+        'application_name': 'dsql_elasticache_setup',
     }
 }
 
+# Valkey key prefix for per-table version counters; must match table_version_key()
+# in cloudshell_dsql_elasticache.py. Cached query keys embed these versions.
+TABLE_VERSION_KEY_PREFIX = 'dsql:ver:'
+
+# Column layout for the users1 sample table printed after seeding
+USERS1_HEADER_FMT = "{:<4} {:<15} {:<25} {:<12} {:<10}"
+USERS1_ROW_FMT = "{:<4} {:<15} {:<25} {:<12} ${:<9}"
+
+NS_PER_MS = 1_000_000
+
+# Auth tokens are reused for this long; DSQL tokens stay valid for 15 minutes
+TOKEN_CACHE_SECONDS = 600
+
+# boto3 client and per-endpoint (token, issued_at) pairs shared by every connect
+_DSQL_CLIENT = None
+_TOKEN_CACHE: dict = {}
+
+
+def load_drivers():
+    """Import boto3 and psycopg2 into the module namespace on first use."""
+    global boto3, psycopg2
+    if psycopg2 is None:
+        import boto3 as _boto3
+        import boto3.exceptions
+        import psycopg2 as _psycopg2
+        import psycopg2.extras
+        boto3, psycopg2 = _boto3, _psycopg2
+
+def get_auth_token(cluster_endpoint: str) -> str:
+    """Return a DSQL admin auth token, reusing the cached one while it is still fresh."""
+    global _DSQL_CLIENT
+    cached = _TOKEN_CACHE.get(cluster_endpoint)
+    if cached and time.monotonic() - cached[1] < TOKEN_CACHE_SECONDS:
+        return cached[0]
+    
+    if _DSQL_CLIENT is None:
+        # boto3 warns about older Python versions when it builds its default session;
+        # silence that here without leaving a process-wide filter behind
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', boto3.exceptions.PythonDeprecationWarning)
+            _DSQL_CLIENT = boto3.client("dsql", region_name=CONFIG['dsql']['region'])
+    token = _DSQL_CLIENT.generate_db_connect_admin_auth_token(
+        cluster_endpoint, 
+        CONFIG['dsql']['region']
+    )
+    _TOKEN_CACHE[cluster_endpoint] = (token, time.monotonic())
+    return token
+
 def create_dsql_connection(cluster_endpoint: str):
     """Create a connection to the DSQL cluster."""
     try:
-        # Get DSQL client and generate auth token
-        client = boto3.client("dsql", region_name=CONFIG['dsql']['region'])
-        password_token = client.generate_db_connect_admin_auth_token(
-            cluster_endpoint, 
-            CONFIG['dsql']['region']
-        )
+        load_drivers()
+        
+        # Get a (possibly cached) auth token
+        password_token = get_auth_token(cluster_endpoint)
         
         # Connection parameters
         conn_params = {
@@ -50,7 +105,13 @@ def create_dsql_connection(cluster_endpoint: str):
             'user': CONFIG['dsql']['user'],
             'host': cluster_endpoint,
             'sslmode': CONFIG['dsql']['ssl_mode'],
-            'password': password_token
+            'password': password_token,
+            'keepalives': 1,
+            'keepalives_idle': CONFIG['dsql']['keepalives_idle'],
+            'keepalives_interval': CONFIG['dsql']['keepalives_interval'],
+            'keepalives_count': CONFIG['dsql']['keepalives_count'],
+            'application_name': CONFIG['dsql']['application_name'],
+            'options': f"-c statement_timeout={CONFIG['dsql']['statement_timeout_ms']}"
         }
         
         # Only add sslrootcert if it's specified
@@ -58,6 +119,9 @@ def create_dsql_connection(cluster_endpoint: str):
             conn_params['sslrootcert'] = CONFIG['dsql']['ssl_root_cert']
         
         print(f"[CONNECT] Connecting to DSQL cluster: {cluster_endpoint}")
+        # No cursor_factory on purpose: the default tuple cursor allocates one tuple per row,
+        # where DictCursor/RealDictCursor would add a dict per row. Code that needs column
+        # names should read cur.description rather than switching cursor types.
         conn = psycopg2.connect(**conn_params)
         conn.set_session(autocommit=True)
         print("[OK] Successfully connected to DSQL")
@@ -67,46 +131,202 @@ def create_dsql_connection(cluster_endpoint: str):
         print(f"[ERROR] Error connecting to DSQL: {e}")
         raise
 
+# PostgreSQL binary COPY framing: signature, flags word and header-extension length
+PGCOPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('!ii', 0, 0)
+PGCOPY_TRAILER = struct.pack('!h', -1)
+PG_EPOCH_DATE = datetime.date(2000, 1, 1)
+PG_EPOCH_TIMESTAMP = datetime.datetime(2000, 1, 1)
+
+
+def _encode_numeric(value) -> bytes:
+    """Encode a decimal as PostgreSQL's binary numeric: base-10000 digit groups."""
+    d = decimal.Decimal(value)
+    int_part, _, frac_part = format(abs(d), 'f').partition('.')
+    int_part = int_part.zfill(-(-len(int_part) // 4) * 4)
+    padded_frac = frac_part.ljust(-(-len(frac_part) // 4) * 4, '0')
+    all_digits = int_part + padded_frac
+    digits = [int(all_digits[i:i + 4]) for i in range(0, len(all_digits), 4)]
+    weight = len(int_part) // 4 - 1
+    
+    while digits and digits[0] == 0:
+        digits.pop(0)
+        weight -= 1
+    while digits and digits[-1] == 0:
+        digits.pop()
+    if not digits:
+        weight = 0
+    
+    sign = 0x4000 if d.is_signed() and digits else 0x0000
+    return struct.pack(f'!hhHh{len(digits)}h', len(digits), weight, sign, len(frac_part), *digits)
+
+
+def _encode_date(value) -> bytes:
+    """Encode a date as PostgreSQL's binary date: days since the 2000-01-01 epoch."""
+    if isinstance(value, str):
+        value = datetime.date.fromisoformat(value)
+    return struct.pack('!i', (value - PG_EPOCH_DATE).days)
+
+
+def _encode_timestamp(value) -> bytes:
+    """Encode a timestamp as PostgreSQL's binary timestamp: microseconds since the 2000-01-01 epoch."""
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    return struct.pack('!q', (value - PG_EPOCH_TIMESTAMP) // datetime.timedelta(microseconds=1))
+
+
+# Binary encoders for the column types used by the fixtures
+BINARY_ENCODERS = {
+    'int4': lambda v: struct.pack('!i', v),
+    'text': lambda v: v.encode('utf-8'),
+    'numeric': _encode_numeric,
+    'date': _encode_date,
+    'timestamp': _encode_timestamp,
+    'bool': lambda v: b'\x01' if v else b'\x00',
+}
+
+
+def encode_copy_binary(types, rows) -> bytes:
+    """Serialize rows in COPY ... WITH (FORMAT BINARY) wire format."""
+    encoders = [BINARY_ENCODERS[t] for t in types]
+    field_count = struct.pack('!h', len(encoders))
+    parts = [PGCOPY_HEADER]
+    for row in rows:
+        parts.append(field_count)
+        for encode, value in zip(encoders, row):
+            if value is None:
+                parts.append(struct.pack('!i', -1))
+            else:
+                data = encode(value)
+                parts.append(struct.pack('!i', len(data)))
+                parts.append(data)
+    parts.append(PGCOPY_TRAILER)
+    return b''.join(parts)
+
+
+def copy_rows(cur, table: str, columns, rows):
+    """Load rows into a table with one COPY ... FROM STDIN stream instead of an INSERT.
+    
+    columns is a sequence of (name, type) pairs, with types keyed into BINARY_ENCODERS.
+    Binary COPY is tried first; if the server rejects it, CSV COPY and then a single
+    multi-row INSERT via execute_values are used.
+    """
+    column_list = ', '.join(name for name, _ in columns)
+    try:
+        binary_buf = io.BytesIO(encode_copy_binary([t for _, t in columns], rows))
+        cur.copy_expert(f"COPY {table} ({column_list}) FROM STDIN WITH (FORMAT BINARY)", binary_buf)
+        return
+    except psycopg2.NotSupportedError as e:
+        print(f"[WARN] Binary COPY not supported ({e}), falling back to CSV COPY")
+    
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator='\n').writerows(rows)
+    buf.seek(0)
+    try:
+        cur.copy_expert(f"COPY {table} ({column_list}) FROM STDIN WITH (FORMAT CSV)", buf)
+    except psycopg2.NotSupportedError as e:
+        print(f"[WARN] COPY not supported ({e}), falling back to INSERT")
+        psycopg2.extras.execute_values(
+            cur,
+            f"INSERT INTO {table} ({column_list}) VALUES %s ON CONFLICT DO NOTHING",
+            rows,
+            page_size=1000
+        )
+
+
+# Fixture data. Each *_COLUMNS entry is a (name, type) pair; types key into BINARY_ENCODERS.
+# Scale a fixture for load testing by extending or generating the *_ROWS lists.
+USERS1_COLUMNS = (
+    ('id', 'int4'), ('name', 'text'), ('email', 'text'), ('age', 'int4'),
+    ('department', 'text'), ('salary', 'numeric'), ('hire_date', 'date'), ('is_active', 'bool'),
+)
+USERS1_ROWS = [
+    (1, 'John Doe', 'john.doe@company.com', 30, 'Engineering', '75000.00', '2022-01-15', True),
+    (2, 'Jane Smith', 'jane.smith@company.com', 28, 'Marketing', '65000.00', '2022-02-20', True),
+    (3, 'Mike Johnson', 'mike.johnson@company.com', 35, 'Engineering', '85000.00', '2021-11-10', True),
+    (4, 'Sarah Wilson', 'sarah.wilson@company.com', 32, 'Sales', '70000.00', '2022-03-05', True),
+    (5, 'David Brown', 'david.brown@company.com', 29, 'Engineering', '78000.00', '2022-01-25', True),
+    (6, 'Lisa Garcia', 'lisa.garcia@company.com', 31, 'HR', '62000.00', '2022-04-12', True),
+    (7, 'Tom Davis', 'tom.davis@company.com', 27, 'Marketing', '58000.00', '2022-05-18', True),
+    (8, 'Emma Martinez', 'emma.martinez@company.com', 33, 'Engineering', '82000.00', '2021-12-08', True),
+    (9, 'Chris Anderson', 'chris.anderson@company.com', 26, 'Sales', '67000.00', '2022-06-22', True),
+    (10, 'Amy Taylor', 'amy.taylor@company.com', 34, 'Engineering', '88000.00', '2021-10-15', True),
+]
+
+USERS_COLUMNS = (
+    ('user_id', 'int4'), ('name', 'text'), ('email', 'text'),
+    ('department', 'text'), ('role', 'text'), ('last_login', 'timestamp'),
+)
+USERS_ROWS = [
+    (1, 'John Doe', 'john.doe@company.com', 'Engineering', 'Senior Developer', '2024-01-15 10:30:00'),
+    (2, 'Jane Smith', 'jane.smith@company.com', 'Marketing', 'Marketing Manager', '2024-01-14 09:15:00'),
+    (3, 'Mike Johnson', 'mike.johnson@company.com', 'Engineering', 'Tech Lead', '2024-01-15 11:45:00'),
+    (4, 'Sarah Wilson', 'sarah.wilson@company.com', 'Sales', 'Sales Director', '2024-01-13 14:20:00'),
+    (5, 'David Brown', 'david.brown@company.com', 'Engineering', 'Developer', '2024-01-15 08:00:00'),
+]
+
+ORDERS_COLUMNS = (
+    ('order_id', 'int4'), ('user_id', 'int4'), ('order_date', 'date'),
+    ('order_amount', 'numeric'), ('order_type', 'text'),
+)
+# (order_id, user_id, days_ago, order_amount, order_type); dates are resolved at load time
+# so they always fall inside the complex query's 30-day window
+ORDERS_ROWS = [
+    (1, 1, 5, '150.00', 'Product'),
+    (2, 1, 10, '200.00', 'Service'),
+    (3, 1, 15, '75.00', 'Product'),
+    (4, 2, 3, '300.00', 'Service'),
+    (5, 2, 20, '125.00', 'Product'),
+    (6, 3, 7, '450.00', 'Product'),
+    (7, 3, 12, '180.00', 'Service'),
+    (8, 4, 2, '220.00', 'Product'),
+    (9, 5, 8, '95.00', 'Service'),
+    (10, 5, 25, '310.00', 'Product'),
+]
+
+
+def bump_table_versions(tables):
+    """
+    Invalidate cached query results for freshly seeded tables.
+    
+    A dropped and re-seeded table starts from the same version counter, so without
+    a bump the demo could serve results cached before the reset. Needs VALKEY_ENDPOINT;
+    failures only print a warning since the database itself is already set up.
+    """
+    valkey_endpoint = os.environ.get('VALKEY_ENDPOINT')
+    if not valkey_endpoint:
+        print(f"[WARN] VALKEY_ENDPOINT not set; run INCR {TABLE_VERSION_KEY_PREFIX}<table> "
+              f"for {', '.join(tables)} to invalidate cached results")
+        return
+    
+    try:
+        import redis
+        client = redis.Redis(
+            host=valkey_endpoint,
+            port=6379,
+            ssl=True,
+            ssl_check_hostname=False,
+            ssl_cert_reqs=None,
+            socket_connect_timeout=10,
+            socket_timeout=10
+        )
+        pipe = client.pipeline(transaction=False)
+        for table in tables:
+            pipe.incr(f"{TABLE_VERSION_KEY_PREFIX}{table}")
+        pipe.execute()
+        print(f"[CACHE] Invalidated cached results for: {', '.join(tables)}")
+    except Exception as e:
+        print(f"[WARN] Could not bump cache versions ({e}); run INCR {TABLE_VERSION_KEY_PREFIX}<table> "
+              f"for {', '.join(tables)} before the next demo run")
+
+
 def setup_simple_database(cur):
     """Set up users1 table for simple queries."""
     print("\n[SETUP] Setting up users1 table for simple queries...")
     
-    # Check if table already exists
-    print("[CHECK] Checking if users1 table exists...")
+    # Create the table (DSQL basic schema - minimal features); a no-op when it already exists
+    print("[CREATE] Ensuring users1 table exists...")
     cur.execute("""
-        SELECT EXISTS (
-            SELECT FROM information_schema.tables 
-            WHERE table_schema = 'public' 
-            AND table_name = 'users1'
-        );
-    """)
-    table_exists = cur.fetchone()[0]
-    
-    if table_exists:
-        print("[EXISTS] users1 table already exists")
-        
-        # Check row count
-        cur.execute("SELECT COUNT(*) FROM users1;")
-        row_count = cur.fetchone()[0]
-        print(f"[COUNT] Current row count: {row_count}")
-        
-        if row_count == 0:
-            print("[EMPTY] Table is empty, adding test data...")
-        else:
-            print("[OK] Table already has data")
-            # Show sample data
-            cur.execute("SELECT * FROM users1 LIMIT 5;")
-            sample_data = cur.fetchall()
-            print("[SAMPLE] Sample data:")
-            for row in sample_data:
-                print(f"   {row}")
-            return
-    else:
-        print("[CREATE] Creating users1 table...")
-        
-        # Create the table (DSQL basic schema - minimal features)
-        create_table_sql = """
-        CREATE TABLE users1 (
+        CREATE TABLE IF NOT EXISTS users1 (
             id INTEGER PRIMARY KEY,
             name VARCHAR(100) NOT NULL,
             email VARCHAR(100) UNIQUE NOT NULL,
@@ -116,45 +336,45 @@ def setup_simple_database(cur):
             hire_date DATE,
             is_active BOOLEAN
         );
-        """
-        
-        cur.execute(create_table_sql)
-        print("[OK] users1 table created successfully")
+    """)
+    
+    # One probe returns both the total row count and a sample of existing rows
+    cur.execute("""
+        SELECT id, name, email, department, salary, count(*) OVER ()
+        FROM users1 LIMIT 5;
+    """)
+    sample_data = cur.fetchall()
+    row_count = sample_data[0][5] if sample_data else 0
+    print(f"[COUNT] Current row count: {row_count}")
+    
+    if row_count > 0:
+        print("[OK] Table already has data")
+        print("[SAMPLE] Sample data:")
+        sys.stdout.write("".join(f"   {row[:5]}\n" for row in sample_data))
+        return
     
     # Insert test data
     print("[INSERT] Inserting test data...")
     
-    insert_sql = """
-    INSERT INTO users1 (id, name, email, age, department, salary, hire_date, is_active) VALUES
-    (1, 'John Doe', 'john.doe@company.com', 30, 'Engineering', 75000.00, '2022-01-15', true),
-    (2, 'Jane Smith', 'jane.smith@company.com', 28, 'Marketing', 65000.00, '2022-02-20', true),
-    (3, 'Mike Johnson', 'mike.johnson@company.com', 35, 'Engineering', 85000.00, '2021-11-10', true),
-    (4, 'Sarah Wilson', 'sarah.wilson@company.com', 32, 'Sales', 70000.00, '2022-03-05', true),
-    (5, 'David Brown', 'david.brown@company.com', 29, 'Engineering', 78000.00, '2022-01-25', true),
-    (6, 'Lisa Garcia', 'lisa.garcia@company.com', 31, 'HR', 62000.00, '2022-04-12', true),
-    (7, 'Tom Davis', 'tom.davis@company.com', 27, 'Marketing', 58000.00, '2022-05-18', true),
-    (8, 'Emma Martinez', 'emma.martinez@company.com', 33, 'Engineering', 82000.00, '2021-12-08', true),
-    (9, 'Chris Anderson', 'chris.anderson@company.com', 26, 'Sales', 67000.00, '2022-06-22', true),
-    (10, 'Amy Taylor', 'amy.taylor@company.com', 34, 'Engineering', 88000.00, '2021-10-15', true)
-    ON CONFLICT (email) DO NOTHING;
-    """
-    
-    cur.execute(insert_sql)
+    # The table is new or empty here, so rows can be streamed in without conflict handling
+    copy_rows(cur, 'users1', USERS1_COLUMNS, USERS1_ROWS)
+    bump_table_versions(['users1'])
     
-    # Check how many rows were inserted
-    cur.execute("SELECT COUNT(*) FROM users1;")
-    total_rows = cur.fetchone()[0]
+    # Check how many rows were inserted and fetch a sample in the same round trip
+    cur.execute("""
+        SELECT id, name, email, department, salary, count(*) OVER ()
+        FROM users1 LIMIT 5;
+    """)
+    sample_data = cur.fetchall()
+    total_rows = sample_data[0][5] if sample_data else 0
     print(f"[OK] Test data inserted successfully. Total rows: {total_rows}")
     
     # Show sample of the data
     print("\n[SAMPLE] Sample data from users1 table:")
-    cur.execute("SELECT id, name, email, department, salary FROM users1 LIMIT 5;")
-    sample_data = cur.fetchall()
-    
-    print(f"{'ID':<4} {'Name':<15} {'Email':<25} {'Department':<12} {'Salary':<10}")
-    print("-" * 70)
-    for row in sample_data:
-        print(f"{row[0]:<4} {row[1]:<15} {row[2]:<25} {row[3]:<12} ${row[4]:<9}")
+    # Header, separator and rows go out in a single write
+    lines = [USERS1_HEADER_FMT.format('ID', 'Name', 'Email', 'Department', 'Salary'), "-" * 70]
+    lines.extend(USERS1_ROW_FMT.format(*row[:5]) for row in sample_data)
+    sys.stdout.write("\n".join(lines) + "\n")
     
     print(f"\n[OK] users1 table setup complete!")
 
@@ -190,73 +410,70 @@ def setup_complex_database(cur):
     """)
     print("[OK] orders table created")
     
-    # Check if data already exists
-    cur.execute("SELECT COUNT(*) FROM users;")
-    user_count = cur.fetchone()[0]
+    # Index the join column used by the complex query; DSQL builds indexes asynchronously
+    print("[CREATE] Creating index on orders(user_id)...")
+    cur.execute("CREATE INDEX ASYNC IF NOT EXISTS idx_orders_user_id ON orders (user_id);")
+    print("[OK] orders(user_id) index requested")
+    
+    # Check if data already exists (both tables in one round trip)
+    cur.execute("SELECT (SELECT count(*) FROM users), (SELECT count(*) FROM orders);")
+    user_count, order_count = cur.fetchone()
     
     if user_count > 0:
         print(f"[EXISTS] users table already has {user_count} rows")
-        cur.execute("SELECT COUNT(*) FROM orders;")
-        order_count = cur.fetchone()[0]
         print(f"[EXISTS] orders table already has {order_count} rows")
         return
     
     # Insert test data into users
     print("[INSERT] Inserting test data into users table...")
-    cur.execute("""
-        INSERT INTO users (user_id, name, email, department, role, last_login) VALUES
-        (1, 'John Doe', 'john.doe@company.com', 'Engineering', 'Senior Developer', '2024-01-15 10:30:00'),
-        (2, 'Jane Smith', 'jane.smith@company.com', 'Marketing', 'Marketing Manager', '2024-01-14 09:15:00'),
-        (3, 'Mike Johnson', 'mike.johnson@company.com', 'Engineering', 'Tech Lead', '2024-01-15 11:45:00'),
-        (4, 'Sarah Wilson', 'sarah.wilson@company.com', 'Sales', 'Sales Director', '2024-01-13 14:20:00'),
-        (5, 'David Brown', 'david.brown@company.com', 'Engineering', 'Developer', '2024-01-15 08:00:00')
-        ON CONFLICT (email) DO NOTHING;
-    """)
+    copy_rows(cur, 'users', USERS_COLUMNS, USERS_ROWS)
     
     # Insert test data into orders
     print("[INSERT] Inserting test data into orders table...")
+    today = datetime.date.today()
+    copy_rows(cur, 'orders', ORDERS_COLUMNS, [
+        (order_id, user_id, today - datetime.timedelta(days=days_ago), amount, order_type)
+        for order_id, user_id, days_ago, amount, order_type in ORDERS_ROWS
+    ])
+    bump_table_versions(['users', 'orders'])
+    
+    # Refresh planner statistics now that orders has rows
+    try:
+        cur.execute("ANALYZE orders;")
+    except psycopg2.Error as e:
+        print(f"[WARN] Could not analyze orders table: {e}")
+    
+    # Verify data: each sample query also carries its table's total row count
+    cur.execute("SELECT user_id, name, email, department, count(*) OVER () FROM users LIMIT 3;")
+    user_sample = cur.fetchall()
     cur.execute("""
-        INSERT INTO orders (order_id, user_id, order_date, order_amount, order_type) VALUES
-        (1, 1, CURRENT_DATE - INTERVAL '5 days', 150.00, 'Product'),
-        (2, 1, CURRENT_DATE - INTERVAL '10 days', 200.00, 'Service'),
-        (3, 1, CURRENT_DATE - INTERVAL '15 days', 75.00, 'Product'),
-        (4, 2, CURRENT_DATE - INTERVAL '3 days', 300.00, 'Service'),
-        (5, 2, CURRENT_DATE - INTERVAL '20 days', 125.00, 'Product'),
-        (6, 3, CURRENT_DATE - INTERVAL '7 days', 450.00, 'Product'),
-        (7, 3, CURRENT_DATE - INTERVAL '12 days', 180.00, 'Service'),
-        (8, 4, CURRENT_DATE - INTERVAL '2 days', 220.00, 'Product'),
-        (9, 5, CURRENT_DATE - INTERVAL '8 days', 95.00, 'Service'),
-        (10, 5, CURRENT_DATE - INTERVAL '25 days', 310.00, 'Product');
+        SELECT order_id, user_id, order_date, order_amount, order_type, count(*) OVER ()
+        FROM orders LIMIT 3;
     """)
-    
-    # Verify data
-    cur.execute("SELECT COUNT(*) FROM users;")
-    user_count = cur.fetchone()[0]
-    cur.execute("SELECT COUNT(*) FROM orders;")
-    order_count = cur.fetchone()[0]
+    order_sample = cur.fetchall()
+    user_count = user_sample[0][4] if user_sample else 0
+    order_count = order_sample[0][5] if order_sample else 0
     
     print(f"[OK] Test data inserted successfully")
     print(f"[COUNT] Users: {user_count}, Orders: {order_count}")
     
     # Show sample data
     print("\n[SAMPLE] Sample data from users table:")
-    cur.execute("SELECT user_id, name, email, department FROM users LIMIT 3;")
-    sample_data = cur.fetchall()
-    for row in sample_data:
-        print(f"   ID: {row[0]}, Name: {row[1]}, Email: {row[2]}, Dept: {row[3]}")
+    sys.stdout.write("".join(
+        f"   ID: {row[0]}, Name: {row[1]}, Email: {row[2]}, Dept: {row[3]}\n" for row in user_sample
+    ))
     
     print("\n[SAMPLE] Sample data from orders table:")
-    cur.execute("SELECT order_id, user_id, order_date, order_amount, order_type FROM orders LIMIT 3;")
-    sample_data = cur.fetchall()
-    for row in sample_data:
-        print(f"   Order: {row[0]}, User: {row[1]}, Date: {row[2]}, Amount: ${row[3]}, Type: {row[4]}")
+    sys.stdout.write("".join(
+        f"   Order: {row[0]}, User: {row[1]}, Date: {row[2]}, Amount: ${row[3]}, Type: {row[4]}\n"
+        for row in order_sample
+    ))
     
     print(f"\n[OK] users and orders tables setup complete!")
 
 
-def setup_database(cluster_endpoint: str, query_type: str = 'simple'):
-    """Set up the database schema and test data."""
-    conn = create_dsql_connection(cluster_endpoint)
+def setup_database(conn, query_type: str = 'simple'):
+    """Set up the database schema and test data on an open connection."""
     cur = conn.cursor()
     
     try:
@@ -271,37 +488,62 @@ def setup_database(cluster_endpoint: str, query_type: str = 'simple'):
     except Exception as e:
         print(f"[ERROR] Error setting up database: {e}")
         raise
-    finally:
-        conn.close()
-        print("[CLOSE] Database connection closed")
 
-def test_query(cluster_endpoint: str):
+def test_query(conn):
     """Test the query that will be used in the performance test."""
     print("\n[TEST] Testing the query that will be used in performance test...")
     
-    conn = create_dsql_connection(cluster_endpoint)
+    # Default tuple cursor: this is the timed fetch path
     cur = conn.cursor()
     
     try:
-        start_time = datetime.datetime.now()
+        start_ns = time.perf_counter_ns()
         cur.execute("SELECT * FROM users1;")
-        results = cur.fetchall()
-        end_time = datetime.datetime.now()
-        
-        query_time = end_time - start_time
+        # Only the row count is reported, so don't build a Python tuple per row
+        row_count = cur.rowcount
+        elapsed_ms = (time.perf_counter_ns() - start_ns) / NS_PER_MS
         
-        print(f"[OK] Query executed successfully!")
-        print(f"[COUNT] Returned {len(results)} rows")
-        print(f"[TIME] Query time: {query_time}")
-        print(f"[READY] Ready for ElastiCache performance comparison!")
+        print("\n".join([
+            "[OK] Query executed successfully!",
+            f"[COUNT] Returned {row_count} rows",
+            f"[TIME] Query time: {elapsed_ms:.3f} ms",
+            "[READY] Ready for ElastiCache performance comparison!",
+        ]))
         
     except Exception as e:
         print(f"[ERROR] Error testing query: {e}")
         raise
-    finally:
-        conn.close()
+    
+    explain_query(cur, "SELECT * FROM users1;")
+
+def explain_query(cur, query: str):
+    """Print the server-side execution time and storage reads for a query."""
+    # Plan capture is diagnostic only; never fail setup because of it
+    try:
+        cur.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}")
+        plan = cur.fetchone()[0]
+        # psycopg2 decodes json columns already, but tolerate a raw text plan too
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        top = plan[0]
+        execution_time = top.get('Execution Time', 'n/a')
+        read_blocks = top.get('Plan', {}).get('Shared Read Blocks', 'n/a')
+    except (psycopg2.Error, ValueError, TypeError, IndexError, KeyError, AttributeError) as e:
+        print(f"[WARN] Could not capture query plan: {e}")
+        return
+    
+    print(f"[PLAN] Execution time: {execution_time} ms, shared read blocks: {read_blocks}")
+
+USAGE = """Usage: python3 setup_database.py [DSQL_ENDPOINT] [simple|complex]
+
+Creates and seeds the demo tables on an Aurora DSQL cluster.
+DSQL_ENDPOINT defaults to $DSQL_ENDPOINT; the query type defaults to simple."""
 
 def main():
+    if any(arg in ('-h', '--help') for arg in sys.argv[1:]):
+        print(USAGE)
+        return
+    
     # Default DSQL endpoint
     default_dsql_endpoint = "d4abulc3ivg4d4knvmfotcybse.dsql.us-east-1.on.aws"
     
@@ -314,19 +556,24 @@ def main():
     if len(sys.argv) > 2:
         query_type = sys.argv[2]
     
-    print("[START] DSQL Database Setup")
-    print("=" * 50)
-    print(f"DSQL Endpoint: {cluster_endpoint}")
-    print(f"Query Type: {query_type}")
-    print(f"Timestamp: {datetime.datetime.now()}")
-    print()
+    print("\n".join([
+        "[START] DSQL Database Setup",
+        "=" * 50,
+        f"DSQL Endpoint: {cluster_endpoint}",
+        f"Query Type: {query_type}",
+        f"Timestamp: {datetime.datetime.now()}",
+        "",
+    ]))
     
     try:
-        # Setup database
-        setup_database(cluster_endpoint, query_type)
-        
-        # Test the query
-        test_query(cluster_endpoint)
+        # One connection serves both steps, so the TLS handshake and auth happen once
+        with closing(create_dsql_connection(cluster_endpoint)) as conn:
+            # Setup database
+            setup_database(conn, query_type)
+            
+            # Test the query
+            test_query(conn)
+        print("[CLOSE] Database connection closed")
         
         print("\n[COMPLETE] Setup complete! You can now run the ElastiCache performance test.")
         